@@ -1,12 +1,19 @@
 import argparse
 import sys
 import importlib
+import importlib.util
 from pathlib import Path
 
 def execute_task(name):
     """Execute a functional task from ./task/ by the name of the subdirectory"""
     try:
-        module = importlib.import_module(f"task.{name}")
+        # Locate the task without executing it so a missing task fails fast
+        spec = importlib.util.find_spec(f"task.{name}")
+        if spec is None:
+            raise ModuleNotFoundError(f"No module named 'task.{name}'")
+
+        # import_module binds the task onto the task package and reuses an already loaded module
+        module = importlib.import_module(spec.name)
 
         if hasattr(module, name):
             func = getattr(module, name)
@@ -15,12 +22,12 @@ def execute_task(name):
         else:
             print(f"Task by name \"{name}\" could not be found.")
     except ImportError:
-        task_path = Path(f"task/{task_name}")
+        task_path = Path(f"task/{name}")
         if task_path.exists():
-            print(f"Task directory '{task_name}' exists but could not import task.{task_name}")
+            print(f"Task directory '{name}' exists but could not import task.{name}")
             print("Make sure the task has an __init__.py file")
         else:
-            print(f"No task found: {task_name}")
+            print(f"No task found: {name}")
 
 def main():
     parser = argparse.ArgumentParser(description="Task runner")
@@ -1,5 +1,13 @@
+import sys
+from array import array
 from collections import defaultdict, deque
-from typing import Dict, List, Set, Optional, Iterator, Tuple
+from itertools import compress
+from typing import Dict, FrozenSet, List, Set, Optional, Iterator, Tuple
+
+_BIT_SELECTORS = bytes.maketrans(b'01', b'\x00\x01')
+
+# (nodes, adjacency, reverse adjacency, initial in-degrees) over integer node indices
+_Snapshot = Tuple[List[str], List[Tuple[int, ...]], List[Tuple[int, ...]], array]
 
 
 class DependencyGraph:
@@ -9,24 +17,36 @@ class DependencyGraph:
         self.nodes: Set[str] = set()
         self.edges: Dict[str, Set[str]] = defaultdict(set)
         self.reverse_edges: Dict[str, Set[str]] = defaultdict(set)
+        self._tc_cache: Dict[str, FrozenSet[str]] = {}
+        self._scratch: Optional[_Snapshot] = None
+        self._frozen = False
     
     def add_node(self, node: str) -> None:
         """Add a node to the graph"""
-        self.nodes.add(node)
+        self._check_mutable()
+        node = sys.intern(node)
+        if node not in self.nodes:
+            self.nodes.add(node)
+            self._scratch = None
     
     def add_edge(self, from_node: str, to_node: str) -> None:
         """Add dependency edge: from_node depends on to_node"""
+        from_node = sys.intern(from_node)
+        to_node = sys.intern(to_node)
         self.add_node(from_node)
         self.add_node(to_node)
         self.edges[from_node].add(to_node)
         self.reverse_edges[to_node].add(from_node)
+        self._invalidate()
     
     def remove_node(self, node: str) -> None:
         """Remove node and all its edges"""
+        self._check_mutable()
         if node not in self.nodes:
             return
         
         self.nodes.remove(node)
+        self._invalidate()
         
         # Remove outgoing edges
         for dep in self.edges[node]:
@@ -38,135 +58,214 @@ class DependencyGraph:
             self.edges[dependent].discard(node)
         del self.reverse_edges[node]
     
+    def freeze(self) -> None:
+        """Convert edge sets to tuples once the graph is fully built; further mutation raises"""
+        if self._frozen:
+            return
+        self.edges = {node: tuple(self.edges.get(node, ())) for node in self.nodes}
+        self.reverse_edges = {node: tuple(self.reverse_edges.get(node, ())) for node in self.nodes}
+        self._frozen = True
+        self._scratch = None
+        self._snapshot()
+    
     def get_dependencies(self, node: str) -> Set[str]:
         """Get direct dependencies of a node"""
-        return self.edges.get(node, set()).copy()
+        return set(self.edges.get(node, ()))
     
     def get_dependents(self, node: str) -> Set[str]:
         """Get direct dependents of a node"""
-        return self.reverse_edges.get(node, set()).copy()
+        return set(self.reverse_edges.get(node, ()))
     
     def has_cycle(self) -> bool:
         """Detect if graph has circular dependencies"""
-        visited = set()
-        rec_stack = set()
-        
-        def dfs(node: str) -> bool:
-            visited.add(node)
-            rec_stack.add(node)
-            
-            for dep in self.edges[node]:
-                if dep not in visited:
-                    if dfs(dep):
-                        return True
-                elif dep in rec_stack:
-                    return True
-            
-            rec_stack.remove(node)
-            return False
-        
-        for node in self.nodes:
-            if node not in visited:
-                if dfs(node):
-                    return True
-        
-        return False
+        return len(self._kahn_order()) != len(self.nodes)
     
     def find_cycle(self) -> Optional[List[str]]:
         """Find a cycle if one exists"""
-        visited = set()
-        rec_stack = set()
-        path = []
-        
-        def dfs(node: str) -> Optional[List[str]]:
-            visited.add(node)
-            rec_stack.add(node)
-            path.append(node)
-            
-            for dep in self.edges[node]:
-                if dep not in visited:
-                    result = dfs(dep)
-                    if result:
-                        return result
-                elif dep in rec_stack:
-                    # Found cycle, return path from cycle start
-                    cycle_start = path.index(dep)
-                    return path[cycle_start:] + [dep]
-            
-            path.pop()
-            rec_stack.remove(node)
+        nodes, adj, _, _ = self._snapshot()
+        order = self._kahn_order()
+        if len(order) == len(nodes):
             return None
         
-        for node in self.nodes:
-            if node not in visited:
-                cycle = dfs(node)
-                if cycle:
-                    return cycle
+        # Peeled nodes cannot reach a cycle; every leftover node still has a leftover
+        # dependency, so following those edges must revisit a node without backtracking
+        peeled = bytearray(len(nodes))
+        for i in order:
+            peeled[i] = 1
+        
+        node = peeled.index(0)
+        position = {}
+        path = []
+        while node not in position:
+            position[node] = len(path)
+            path.append(node)
+            node = next(dep for dep in adj[node] if not peeled[dep])
         
-        return None
+        # Found cycle, return path from cycle start
+        return [nodes[i] for i in path[position[node]:]] + [nodes[node]]
     
     def topological_sort(self) -> List[str]:
         """Return topologically sorted list (build order)"""
-        if self.has_cycle():
-            raise ValueError(f"Cannot sort cyclic graph. Cycle: {self.find_cycle()}")
-        
-        in_degree = {node: len(self.edges[node]) for node in self.nodes}
-        queue = deque([node for node, degree in in_degree.items() if degree == 0])
-        result = []
+        nodes = self._snapshot()[0]
+        order = self._kahn_order()
         
-        while queue:
-            node = queue.popleft()
-            result.append(node)
-            
-            for dependent in self.reverse_edges[node]:
-                in_degree[dependent] -= 1
-                if in_degree[dependent] == 0:
-                    queue.append(dependent)
+        if len(order) != len(nodes):
+            raise ValueError(f"Cannot sort cyclic graph. Cycle: {self.find_cycle()}")
         
-        return result
+        return [nodes[i] for i in order]
     
     def get_build_levels(self) -> List[List[str]]:
         """Return nodes grouped by build level (parallelizable)"""
-        if self.has_cycle():
-            raise ValueError(f"Cannot level cyclic graph. Cycle: {self.find_cycle()}")
-        
-        in_degree = {node: len(self.edges[node]) for node in self.nodes}
+        nodes, _, radj, initial_in_degree = self._snapshot()
+        in_degree = initial_in_degree[:]
+        frontier = [i for i, degree in enumerate(in_degree) if degree == 0]
         levels = []
+        processed = 0
         
-        while any(degree == 0 for degree in in_degree.values()):
-            current_level = [node for node, degree in in_degree.items() if degree == 0]
-            levels.append(current_level)
+        while frontier:
+            levels.append([nodes[i] for i in frontier])
+            processed += len(frontier)
+            next_frontier = []
+            
+            for i in frontier:
+                for dependent in radj[i]:
+                    in_degree[dependent] -= 1
+                    if in_degree[dependent] == 0:
+                        next_frontier.append(dependent)
             
-            for node in current_level:
-                in_degree[node] = -1  # Mark as processed
-                for dependent in self.reverse_edges[node]:
-                    if in_degree[dependent] > 0:
-                        in_degree[dependent] -= 1
+            frontier = next_frontier
+        
+        if processed != len(nodes):
+            raise ValueError(f"Cannot level cyclic graph. Cycle: {self.find_cycle()}")
         
         return levels
     
     def transitive_closure(self, node: str) -> Set[str]:
         """Get all transitive dependencies of a node"""
+        return set(self._closure(node))
+    
+    def all_transitive_closures(self) -> Dict[str, Set[str]]:
+        """Get transitive dependencies of every node using one bitset row per node"""
+        nodes, adj, _, _ = self._snapshot()
+        order = self._kahn_order()
+        reach = [0] * len(nodes)
+        
+        # Dependencies are peeled first, so each row is final once its deps are merged
+        for i in order:
+            row = 0
+            for dep in adj[i]:
+                row |= reach[dep] | (1 << dep)
+            reach[i] = row
+        
+        if len(order) != len(nodes):
+            # Cyclic remainder has no such order: propagate rows to a fixed point
+            done = set(order)
+            remaining = [i for i in range(len(nodes)) if i not in done]
+            changed = True
+            while changed:
+                changed = False
+                for i in remaining:
+                    row = reach[i]
+                    for dep in adj[i]:
+                        row |= reach[dep] | (1 << dep)
+                    if row != reach[i]:
+                        reach[i] = row
+                        changed = True
+        
+        closures = {}
+        for i, node in enumerate(nodes):
+            # Least significant bit first, as 0/1 bytes that compress() can select with
+            bits = bin(reach[i])[:1:-1].encode().translate(_BIT_SELECTORS)
+            closure = frozenset(compress(nodes, bits))
+            self._tc_cache[node] = closure
+            closures[node] = set(closure)
+        
+        return closures
+    
+    def minimal_dependencies(self, node: str) -> Set[str]:
+        """Get minimal set of direct dependencies (no transitive)"""
+        all_deps = set(self.edges.get(node, ()))
+        return all_deps - set().union(*(self._closure(dep) for dep in all_deps))
+    
+    def _closure(self, node: str) -> FrozenSet[str]:
+        """Cached closure built bottom-up: tc(n) = edges[n] | union(tc(d) for d in edges[n])"""
+        if node in self._tc_cache:
+            return self._tc_cache[node]
+        
+        on_stack = {node}
+        stack = [(node, iter(self.edges.get(node, ())))]
+        
+        while stack:
+            current, deps = stack[-1]
+            for dep in deps:
+                if dep in self._tc_cache:
+                    continue
+                if dep in on_stack:
+                    # Cycle: no bottom-up order exists, walk it directly
+                    return frozenset(self._reachable(node))
+                on_stack.add(dep)
+                stack.append((dep, iter(self.edges[dep])))
+                break
+            else:
+                stack.pop()
+                on_stack.remove(current)
+                direct = self.edges.get(current, ())
+                closure = set(direct)
+                for dep in direct:
+                    closure |= self._tc_cache[dep]
+                self._tc_cache[current] = frozenset(closure)
+        
+        return self._tc_cache[node]
+    
+    def _reachable(self, node: str) -> Set[str]:
+        """Uncached reachability walk, used when the subgraph is cyclic"""
         visited = set()
+        stack = [node]
         
-        def dfs(current: str):
-            for dep in self.edges[current]:
+        while stack:
+            for dep in self.edges.get(stack.pop(), ()):
                 if dep not in visited:
                     visited.add(dep)
-                    dfs(dep)
+                    stack.append(dep)
         
-        dfs(node)
         return visited
     
-    def minimal_dependencies(self, node: str) -> Set[str]:
-        """Get minimal set of direct dependencies (no transitive)"""
-        all_deps = self.edges[node].copy()
-        transitive = set()
+    def _check_mutable(self) -> None:
+        if self._frozen:
+            raise ValueError("Cannot modify a frozen graph")
+    
+    def _invalidate(self) -> None:
+        """Drop derived state after the edge set changes"""
+        self._tc_cache.clear()
+        self._scratch = None
+    
+    def _snapshot(self) -> _Snapshot:
+        """Integer-indexed view of the graph, rebuilt only after mutation"""
+        if self._scratch is None:
+            nodes = list(self.nodes)
+            index = {node: i for i, node in enumerate(nodes)}
+            adj = [tuple(index[dep] for dep in self.edges[node]) for node in nodes]
+            radj = [tuple(index[dependent] for dependent in self.reverse_edges[node]) for node in nodes]
+            self._scratch = (nodes, adj, radj, array('i', map(len, adj)))
+        return self._scratch
+    
+    def _kahn_order(self) -> List[int]:
+        """Indices peeled in dependency order; shorter than the node list if a cycle remains"""
+        _, _, radj, initial_in_degree = self._snapshot()
+        in_degree = initial_in_degree[:]
+        queue = deque(i for i, degree in enumerate(in_degree) if degree == 0)
+        order = []
         
-        for dep in all_deps:
-            transitive.update(self.transitive_closure(dep))
+        while queue:
+            i = queue.popleft()
+            order.append(i)
+            
+            for dependent in radj[i]:
+                in_degree[dependent] -= 1
+                if in_degree[dependent] == 0:
+                    queue.append(dependent)
         
-        return all_deps - transitive
+        return order
     
     def __len__(self) -> int:
         return len(self.nodes)
@@ -1,9 +1,59 @@
 #!/usr/bin/env python3
+import contextlib
 import json
 import os
 import sys
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def json_entry(entry):
+    """Encode one entry with the stdlib, emitting raw UTF-8 like orjson"""
+    try:
+        return json.dumps(entry, separators=(',', ':'), ensure_ascii=False).encode()
+    except UnicodeEncodeError:
+        # Surrogate-escaped (non-UTF-8) filenames have no UTF-8 form; keep them as \u escapes
+        return json.dumps(entry, separators=(',', ':')).encode()
+
+if orjson is not None:
+    def encode_entry(entry):
+        try:
+            return orjson.dumps(entry)
+        except TypeError:
+            # orjson rejects surrogate-escaped filenames that os.scandir yields for non-UTF-8 names
+            return json_entry(entry)
+else:
+    encode_entry = json_entry
+
+def iter_extensionless_files(root):
+    """Yield paths of extensionless files below root"""
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif '.' not in entry.name and entry.is_file():
+                    yield entry.path
+
+def iter_entries(src_abs, base_cmd):
+    """Yield compilation database entries for extensionless module and src files"""
+    prefix_len = len(src_abs) + 1
+    for root in ('module', 'src'):
+        root_dir = os.path.join(src_abs, root)
+        if not os.path.isdir(root_dir):
+            continue
+        for file_path in iter_extensionless_files(root_dir):
+            rel_path = file_path[prefix_len:]
+            yield {
+                "directory": src_abs,
+                "command": base_cmd + rel_path,
+                "file": rel_path
+            }
+
 def main():
     if len(sys.argv) != 3:
         print("Usage: gen_compile_commands.py <build_dir> <source_dir>")
@@ -11,59 +61,36 @@ def main():
     
     build_dir = Path(sys.argv[1])
     source_dir = Path(sys.argv[2])
-    
-    # Find all extensionless module files
-    module_files = []
-    module_dir = source_dir / 'module'
-    
-    if module_dir.exists():
-        for module_file in module_dir.rglob('*'):
-            if module_file.is_file() and '.' not in module_file.name:
-                rel_path = module_file.relative_to(source_dir)
-                module_files.append(str(rel_path))
+    src_abs = str(source_dir.absolute())
     
     # Ultra-minimal flags for ccls - test basic functionality first
     base_flags = [
         "/opt/homebrew/bin/clang++",
         "-std=c++20",
-        "-I" + str(source_dir.absolute()),
-        "-I" + str(source_dir.absolute() / "module"),
-        "-I" + str(source_dir.absolute() / "src"),
+        "-I" + src_abs,
+        "-I" + os.path.join(src_abs, "module"),
+        "-I" + os.path.join(src_abs, "src"),
     ]
+    base_cmd = " ".join(base_flags) + " -c "
     
-    # Create compilation database entries
-    entries = []
-    
-    # Add entry for each module file with virtual .cppm extension for ccls
-    for module_file in module_files:
-        # Add virtual .cppm extension so ccls recognizes as C++ module
-        virtual_file = module_file 
-        entry = {
-            "directory": str(source_dir.absolute()),
-            "command": " ".join(base_flags + ["-c", module_file]),
-            "file": virtual_file
-        }
-        entries.append(entry)
-    
-    # Add src files with virtual .cpp extension for ccls
-    src_dir = source_dir / 'src'
-    if src_dir.exists():
-        for src_file in src_dir.rglob('*'):
-            if src_file.is_file() and '.' not in src_file.name:
-                rel_path = src_file.relative_to(source_dir)
-                # Add virtual .cpp extension so ccls recognizes as C++
-                virtual_file = str(rel_path) 
-                entry = {
-                    "directory": str(source_dir.absolute()),
-                    "command": " ".join(base_flags + ["-c", str(rel_path)]),
-                    "file": virtual_file
-                }
-                entries.append(entry)
-    
-    # Write compile_commands.json
+    # Stream entries straight to compile_commands.json so the full list is never held in memory
     compile_commands_file = build_dir / 'compile_commands.json'
-    with open(compile_commands_file, 'w') as f:
-        json.dump(entries, f, indent=2)
+    # Write to a sibling temp file and swap it in once complete, so a failed walk keeps the old database
+    tmp_path = f"{compile_commands_file}.tmp"
+    count = 0
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(b'[')
+            for entry in iter_entries(src_abs, base_cmd):
+                f.write(b',\n' if count else b'\n')
+                f.write(encode_entry(entry))
+                count += 1
+            f.write(b'\n]\n')
+        os.replace(tmp_path, compile_commands_file)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
     
     # Create symlink in source directory
     if source_dir != build_dir:
@@ -73,7 +100,7 @@ def main():
         symlink_path.symlink_to(compile_commands_file)
 
     
-    print(f"Generated compile_commands.json with {len(entries)} entries")
+    print(f"Generated compile_commands.json with {count} entries")
 
 if __name__ == "__main__":
     main()
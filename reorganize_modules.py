@@ -4,10 +4,14 @@ Module Reorganization Script for synthesis.game
 Moves files from flat structure to hierarchical module organization
 """
 
+import contextlib
+import mmap
 import os
+import re
 import shutil
+import subprocess
 import sys
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 # Module reorganization mapping: current_path -> (new_path, new_module_name, action)
 # Actions: 'move', 'delete', 'keep_as_core'
@@ -85,125 +89,267 @@ SRC_MAPPING = {
     'src/core/metal': 'src/graphic/metal.macos',
 }
 
+# New hierarchical directory structure, de-duplicated and ordered shortest path first
+# so each ancestor is created by its own entry
+DIRECTORIES = sorted(dict.fromkeys([
+    'module/core',
+    'module/memory', 
+    'module/collection',
+    'module/io',
+    'module/math',
+    'module/task',
+    'module/sync',
+    'module/algorithm',
+    'module/system',
+    'module/graphic',
+    'module/voxel',
+    'module/physics',
+    'module/compute',
+    'module/spatial',
+    'module/audio',
+    'src/core',
+    'src/memory',
+    'src/collection', 
+    'src/io',
+    'src/math',
+    'src/task',
+    'src/sync',
+    'src/algorithm',
+    'src/system',
+    'src/graphic',
+    'src/voxel',
+    'src/physics',
+    'src/compute',
+    'src/spatial',
+    'src/audio',
+]), key=len)
+
+# Import rewrites: old module name -> new module name
+IMPORT_MAP = {
+    'result': 'core.result',
+    'variant': 'core.variant',
+    'optional': 'core.optional',
+    'error': 'core.error',
+    'null': 'core.null',
+    'type': 'core.type',
+    'trait': 'core.trait',
+    'platform': 'core.platform',
+    'alloc': 'memory.alloc',
+    'box': 'memory.box',
+    'rc': 'memory.rc',
+    # Add more as needed
+}
+
+# Module units are extensionless or carry a platform suffix; conventional C++ suffixes are kept too.
+# Anything else under module/ (data, build artifacts) is never read.
+SOURCE_SUFFIXES = ('.posix', '.darwin', '.windows', '.macos', '.linux', '.neon', '.avx2', '.sse',
+                   '.ixx', '.cppm', '.mpp', '.cpp', '.hpp', '.h')
+
+# Files larger than this are not module sources and are never scanned
+MAX_REWRITE_BYTES = 4 << 20
+
+# Files are rewritten as raw bytes: every pattern is ASCII, so no decode/encode is needed
+IMPORT_REPLACEMENTS = {old.encode(): f'import {new};'.encode() for old, new in IMPORT_MAP.items()}
+
+# One alternation finds every rewritable import in a single scan of the file
+IMPORT_RE = re.compile(rb'\bimport (' + b'|'.join(map(re.escape, IMPORT_REPLACEMENTS)) + rb');')
+
+# Export declaration line; group 1 keeps the indentation and keywords
+EXPORT_RE = re.compile(rb'^([ \t]*export module )[^;\n]+;', re.MULTILINE)
+
+def replace_import(match):
+    return IMPORT_REPLACEMENTS[match.group(1)]
+
+# Directories already created during this run
+created_directories = set()
+
+def ensure_directory(directory):
+    """Create a directory (and parents) once per run"""
+    if directory in created_directories:
+        return
+    os.makedirs(directory, exist_ok=True)
+    # makedirs also created every ancestor, so none of them needs another call
+    while directory and directory not in created_directories:
+        created_directories.add(directory)
+        directory = os.path.dirname(directory)
+
 def create_directories():
     """Create the new hierarchical directory structure"""
-    directories = [
-        'module/core',
-        'module/memory', 
-        'module/collection',
-        'module/io',
-        'module/math',
-        'module/task',
-        'module/sync',
-        'module/algorithm',
-        'module/system',
-        'module/graphic',
-        'module/voxel',
-        'module/physics',
-        'module/compute',
-        'module/spatial',
-        'module/audio',
-        'src/core',
-        'src/memory',
-        'src/collection', 
-        'src/io',
-        'src/math',
-        'src/task',
-        'src/sync',
-        'src/algorithm',
-        'src/system',
-        'src/graphic',
-        'src/voxel',
-        'src/physics',
-        'src/compute',
-        'src/spatial',
-        'src/audio',
-    ]
-    
-    for directory in directories:
-        Path(directory).mkdir(parents=True, exist_ok=True)
+    for directory in DIRECTORIES:
+        ensure_directory(directory)
         print(f"✅ Created directory: {directory}")
 
+def clone_tree(src, dst):
+    """Copy a directory tree as cheaply as the filesystem allows; returns the method used"""
+    commands = []
+    if sys.platform.startswith('linux'):
+        commands = [('clone', ['cp', '-a', '--reflink=always', src, dst]), ('hardlink', ['cp', '-al', src, dst])]
+    elif sys.platform == 'darwin':
+        commands = [('clone', ['cp', '-a', '-c', src, dst])]
+    
+    for method, command in commands:
+        try:
+            subprocess.run(command, check=True, stderr=subprocess.DEVNULL)
+            return method
+        except (OSError, subprocess.CalledProcessError):
+            # cp missing or this method unsupported: discard any partial copy and try the next one
+            shutil.rmtree(dst, ignore_errors=True)
+    
+    try:
+        shutil.copytree(src, dst, copy_function=os.link)
+        return 'hardlink'
+    except (OSError, shutil.Error):
+        shutil.rmtree(dst, ignore_errors=True)
+    
+    shutil.copytree(src, dst)
+    return 'copy'
+
+def remove_tree(path):
+    """Delete a directory tree with the platform's native tool, falling back to shutil.rmtree"""
+    if sys.platform == 'win32':
+        command = ['cmd', '/c', 'rd', '/s', '/q', path]
+    else:
+        command = ['rm', '-rf', path]
+    
+    try:
+        subprocess.run(command, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    
+    # Tool unavailable or the delete was incomplete: let shutil finish (and raise on real errors)
+    if os.path.lexists(path):
+        shutil.rmtree(path)
+
+def atomic_write(file_path, content):
+    """Replace a file's contents via a sibling temp file, leaving the old inode untouched"""
+    # Write through symlinks, as open(path, 'w') did, instead of replacing the link itself
+    file_path = os.path.realpath(file_path)
+    tmp_path = f"{file_path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        shutil.copymode(file_path, tmp_path)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        # Never leave a half-written temp file behind in the module tree
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
 def backup_current_structure():
-    """Create backup of current structure"""
-    if Path('module_backup').exists():
-        shutil.rmtree('module_backup')
-    if Path('src_backup').exists():
-        shutil.rmtree('src_backup')
+    """Create backup of current structure; returns whether it shares inodes with the originals"""
+    if os.path.lexists('module_backup'):
+        remove_tree('module_backup')
+    if os.path.lexists('src_backup'):
+        remove_tree('src_backup')
         
-    shutil.copytree('module', 'module_backup')
-    shutil.copytree('src', 'src_backup')
+    hardlinked = 'hardlink' in (clone_tree('module', 'module_backup'), clone_tree('src', 'src_backup'))
     print("✅ Created backup: module_backup/ and src_backup/")
+    if hardlinked:
+        print("⚠️  Backup is hardlinked: editing an unmoved file in place also changes its backup copy")
+    return hardlinked
 
-def update_module_export(file_path, new_module_name):
-    """Update the export module statement in a file"""
-    if not Path(file_path).exists():
-        print(f"⚠️  File not found: {file_path}")
-        return
-    
+def apply_export(content, new_module_name):
+    """Return content with its first export module declaration renamed"""
+    # Replace the declaration in place, without splitting into lines
+    return EXPORT_RE.sub(lambda match: match.group(1) + new_module_name.encode() + b';', content, count=1)
+
+def apply_imports(content):
+    """Return content with every mapped import statement rewritten"""
+    return IMPORT_RE.sub(replace_import, content)
+
+def rewrite_module(file_path, new_module_name):
+    """Update the export statement and imports in a file with one read and one write; returns success"""
     try:
-        with open(file_path, 'r') as f:
+        with open(file_path, 'rb') as f:
             content = f.read()
         
-        # Replace the export module line
-        lines = content.split('\n')
-        for i, line in enumerate(lines):
-            if line.strip().startswith('export module '):
-                lines[i] = f'export module {new_module_name};'
-                break
-        
-        with open(file_path, 'w') as f:
-            f.write('\n'.join(lines))
-            
-        print(f"✅ Updated export: {file_path} -> {new_module_name}")
+        exported = apply_export(content, new_module_name)
+        updated = apply_imports(exported)
+        if updated != content:
+            atomic_write(file_path, updated)
+        if exported != content:
+            print(f"✅ Updated export: {file_path} -> {new_module_name}")
+        if updated != exported:
+            print(f"✅ Updated imports: {file_path}")
+        return True
         
+    except FileNotFoundError:
+        print(f"⚠️  File not found: {file_path}")
     except Exception as e:
         print(f"❌ Error updating {file_path}: {e}")
+    return False
 
-def update_import_statements():
-    """Update import statements throughout the codebase"""
-    import_updates = {
-        'import result;': 'import core.result;',
-        'import variant;': 'import core.variant;',
-        'import optional;': 'import core.optional;',
-        'import error;': 'import core.error;',
-        'import null;': 'import core.null;',
-        'import type;': 'import core.type;',
-        'import trait;': 'import core.trait;',
-        'import platform;': 'import core.platform;',
-        'import alloc;': 'import memory.alloc;',
-        'import box;': 'import memory.box;',
-        'import rc;': 'import memory.rc;',
-        # Add more as needed
-    }
+def scan_non_directories(top):
+    """Yield a DirEntry for every non-directory entry below top"""
+    stack = [top]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                else:
+                    yield entry
+
+def update_file_imports(file_path):
+    """Rewrite import statements in one file; returns the line to report, if any"""
+    try:
+        with open(file_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0 or size > MAX_REWRITE_BYTES:
+                return None
+            # Probe the page cache directly; only files that need a rewrite are copied into memory
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                # Most files have nothing to rewrite; reject them before running the regex
+                if mapped.find(b'import ') == -1 or not IMPORT_RE.search(mapped):
+                    return None
+                raw = mapped[:]
+        
+        content = apply_imports(raw)
+        
+        if content != raw:
+            atomic_write(file_path, content)
+            return f"✅ Updated imports: {file_path}"
+            
+    except Exception as e:
+        return f"⚠️  Error updating imports in {file_path}: {e}"
+    return None
+
+def is_source_file(name):
+    return not name.startswith('.') and ('.' not in name or name.endswith(SOURCE_SUFFIXES))
+
+def update_import_statements(rewritten=frozenset()):
+    """Update import statements throughout the codebase, skipping files already rewritten"""
+    # Update all module source files
+    files = [entry.path for entry in scan_non_directories('module')
+             if is_source_file(entry.name) and os.path.normpath(entry.path) not in rewritten and entry.is_file()]
     
-    # Update all module files
-    for root, dirs, files in os.walk('module'):
-        for file in files:
-            if not file.startswith('.'):  # Skip hidden files
-                file_path = Path(root) / file
-                try:
-                    with open(file_path, 'r') as f:
-                        content = f.read()
-                    
-                    updated = False
-                    for old_import, new_import in import_updates.items():
-                        if old_import in content:
-                            content = content.replace(old_import, new_import)
-                            updated = True
-                    
-                    if updated:
-                        with open(file_path, 'w') as f:
-                            f.write(content)
-                        print(f"✅ Updated imports: {file_path}")
-                        
-                except Exception as e:
-                    print(f"⚠️  Error updating imports in {file_path}: {e}")
+    # Each file is independent and the work is mostly blocking I/O, so threads overlap it
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as executor:
+        for message in executor.map(update_file_imports, files):
+            if message:
+                print(message)
+
+def existing_entries(paths):
+    """Map each of the given paths' parent directories to the names it currently holds"""
+    index = {}
+    for directory in {os.path.dirname(path) for path in paths}:
+        try:
+            with os.scandir(directory) as entries:
+                index[directory] = {entry.name for entry in entries}
+        except FileNotFoundError:
+            pass
+    return index
+
+def is_listed(index, path):
+    return os.path.basename(path) in index.get(os.path.dirname(path), ())
 
 def reorganize_modules():
-    """Move module files to their new hierarchical locations"""
+    """Move module files to their new hierarchical locations; returns the files already rewritten"""
+    rewritten = set()
+    existing = existing_entries(MODULE_MAPPING)
     for current_path, (new_path, new_module_name, action) in MODULE_MAPPING.items():
-        if not Path(current_path).exists():
+        if not is_listed(existing, current_path):
             print(f"⚠️  Module not found: {current_path}")
             continue
             
@@ -213,51 +359,66 @@ def reorganize_modules():
             
         elif action == 'keep_as_core':
             # Just update the export statement, don't move
-            update_module_export(current_path, new_module_name)
+            if rewrite_module(current_path, new_module_name):
+                rewritten.add(os.path.normpath(current_path))
             
         elif action == 'move':
-            # Move file to new location
-            Path(new_path).parent.mkdir(parents=True, exist_ok=True)
-            shutil.move(current_path, new_path)
-            update_module_export(new_path, new_module_name)
+            # Move file to new location (same filesystem, so a rename is enough)
+            ensure_directory(os.path.dirname(new_path))
+            os.replace(current_path, new_path)
+            if rewrite_module(new_path, new_module_name):
+                rewritten.add(os.path.normpath(new_path))
             print(f"📦 Moved: {current_path} -> {new_path} (module: {new_module_name})")
+    
+    return rewritten
 
 def reorganize_src_files():
     """Move src files to their new hierarchical locations"""
+    existing = existing_entries(SRC_MAPPING)
     for current_src, new_src in SRC_MAPPING.items():
-        if not Path(current_src).exists():
+        if not is_listed(existing, current_src):
             print(f"⚠️  Source file not found: {current_src}")
             continue
             
         # Create destination directory
-        Path(new_src).parent.mkdir(parents=True, exist_ok=True)
+        ensure_directory(os.path.dirname(new_src))
         
         # Move file
-        shutil.move(current_src, new_src)
+        os.replace(current_src, new_src)
         print(f"📄 Moved source: {current_src} -> {new_src}")
 
+def remove_empty_subdirectories(top):
+    """Remove empty directories below top, deepest first; returns whether top is left empty"""
+    empty = True
+    subdirs = []
+    with os.scandir(top) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            else:
+                empty = False
+    
+    for subdir in subdirs:
+        if remove_empty_subdirectories(subdir):
+            os.rmdir(subdir)
+            print(f"🧹 Removed empty directory: {subdir}")
+        else:
+            empty = False
+    return empty
+
 def clean_empty_directories():
     """Remove empty directories after reorganization"""
-    for root, dirs, files in os.walk('module', topdown=False):
-        for directory in dirs:
-            dir_path = Path(root) / directory
-            if dir_path.exists() and not any(dir_path.iterdir()):
-                dir_path.rmdir()
-                print(f"🧹 Removed empty directory: {dir_path}")
-    
-    for root, dirs, files in os.walk('src', topdown=False):
-        for directory in dirs:
-            dir_path = Path(root) / directory
-            if dir_path.exists() and not any(dir_path.iterdir()):
-                dir_path.rmdir()
-                print(f"🧹 Removed empty directory: {dir_path}")
+    remove_empty_subdirectories('module')
+    remove_empty_subdirectories('src')
 
 def main():
     """Main reorganization process"""
     if len(sys.argv) > 1 and sys.argv[1] == '--dry-run':
-        print("🔍 DRY RUN MODE - No files will be moved")
-        for current_path, (new_path, new_module_name, action) in MODULE_MAPPING.items():
-            print(f"Would {action}: {current_path} -> {new_path} ({new_module_name})")
+        # Report straight from the mapping without touching the filesystem
+        report = ["🔍 DRY RUN MODE - No files will be moved"]
+        report.extend(f"Would {action}: {current_path} -> {new_path} ({new_module_name})"
+                      for current_path, (new_path, new_module_name, action) in MODULE_MAPPING.items())
+        print("\n".join(report))
         return
     
     print("🚀 Starting module reorganization for synthesis.game")
@@ -270,19 +431,19 @@ def main():
     
     try:
         print("\n1️⃣ Creating backup...")
-        backup_current_structure()
+        hardlinked = backup_current_structure()
         
         print("\n2️⃣ Creating new directory structure...")
         create_directories()
         
         print("\n3️⃣ Reorganizing module files...")
-        reorganize_modules()
+        rewritten = reorganize_modules()
         
         print("\n4️⃣ Reorganizing source files...")
         reorganize_src_files()
         
         print("\n5️⃣ Updating import statements...")
-        update_import_statements()
+        update_import_statements(rewritten)
         
         print("\n6️⃣ Cleaning up empty directories...")
         clean_empty_directories()
@@ -298,6 +459,8 @@ def main():
         print("   module/algorithm/   - Algorithms and iteration")
         print("   module/system/      - System utilities")
         print("\n💾 Backup created: module_backup/ and src_backup/")
+        if hardlinked:
+            print("⚠️  The backup shares files with module/ and src/; copy it elsewhere before editing files in place")
         print("\n🔧 Next steps:")
         print("   1. Update discover.py to handle hierarchical modules")
         print("   2. Update meson.build for new module structure")